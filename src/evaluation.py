@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+
+AREA_BUCKETS = [0, 50, 100, 200, 500, 1000, np.inf]
+
+SEGMENT_COLUMNS = ["district", "reg_type_en", "property_type_en"]
+
+
+def default_segments(X, date_col="date", area_col="procedure_area"):
+    """
+    Segmentations available in X: categorical columns, area bucket and month
+    """
+
+    segments = {col: X[col] for col in SEGMENT_COLUMNS if col in X.columns}
+    if area_col in X.columns:
+        segments["area_bucket"] = pd.cut(X[area_col], AREA_BUCKETS, right=False)
+    if date_col in X.columns:
+        segments["month"] = pd.to_datetime(X[date_col]).dt.to_period("M")
+    return segments
+
+
+def evaluate_segments(y_true, y_pred, segments):
+    """
+    Error metrics for every segment of every segmentation in one pass.
+
+    y_true and y_pred are on the original price scale. Each segmentation is
+    factorized into sorted group codes, the codes of all segmentations are
+    offset into one shared range and every sum is a single bincount.
+    """
+
+    y_true = np.asarray(y_true, dtype=float)
+    y_pred = np.asarray(y_pred, dtype=float)
+    n_rows = len(y_true)
+
+    error = y_pred - y_true
+    segments = {"overall": np.zeros(n_rows, dtype=np.int64), **segments}
+
+    names, labels, codes = [], [], []
+    offset = 0
+    for name, values in segments.items():
+        seg_codes, uniques = pd.factorize(pd.Series(values), sort=True)
+        if (seg_codes < 0).any():
+            uniques = np.append(uniques.astype(object), "Missing")
+            seg_codes = np.where(seg_codes < 0, len(uniques) - 1, seg_codes)
+        codes.append(seg_codes + offset)
+        names.extend([name] * len(uniques))
+        labels.extend(["all"] if name == "overall" else [str(u) for u in uniques])
+        offset += len(uniques)
+
+    all_codes = np.concatenate(codes)
+    n_segmentations = len(segments)
+
+    def group_sum(values):
+        return np.bincount(
+            all_codes, weights=np.tile(values, n_segmentations), minlength=offset
+        )
+
+    count = np.bincount(all_codes, minlength=offset)
+    sum_sq_error = group_sum(error**2)
+    sum_abs_error = group_sum(np.abs(error))
+    sum_error = group_sum(error)
+    sum_y = group_sum(y_true)
+    sum_y_sq = group_sum(y_true**2)
+    # Zero targets have no percentage error: they are left out of both the
+    # sum and the count of the MAPE, so one zero can't turn it into NaN
+    has_ape = y_true != 0
+    ape = np.abs(error) / np.where(has_ape, np.abs(y_true), 1.0)
+    sum_ape = group_sum(np.where(has_ape, ape, 0.0))
+    count_ape = group_sum(has_ape.astype(float))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        total_ss = sum_y_sq - sum_y**2 / count
+        metrics = pd.DataFrame(
+            {
+                "segmentation": names,
+                "segment": labels,
+                "n": count,
+                "rmse": np.sqrt(sum_sq_error / count),
+                "mae": sum_abs_error / count,
+                "bias": sum_error / count,
+                "mape": sum_ape / count_ape,
+                "r2": np.where(total_ss > 0, 1 - sum_sq_error / total_ss, np.nan),
+            }
+        )
+
+    return metrics[metrics["n"] > 0].reset_index(drop=True)
+
+
+def groupby_segments(y_true, y_pred, segments):
+    """
+    Same metrics as evaluate_segments with one pandas groupby per
+    segmentation. Slow, used as a reference.
+    """
+
+    y_true = np.asarray(y_true, dtype=float)
+    error = np.asarray(y_pred, dtype=float) - y_true
+
+    frames = []
+    for name, values in {"overall": np.full(len(y_true), "all"), **segments}.items():
+        values = pd.Series(np.asarray(values, dtype=object))
+        df = pd.DataFrame(
+            {
+                "y": y_true,
+                "error": error,
+                "segment": values.map(str).where(values.notna(), "Missing"),
+            }
+        )
+        df["ape"] = (df["error"].abs() / df["y"].abs()).where(df["y"] != 0)
+
+        rows = []
+        for segment, group in df.groupby("segment"):
+            total_ss = ((group["y"] - group["y"].mean()) ** 2).sum()
+            rows.append(
+                {
+                    "segmentation": name,
+                    "segment": segment,
+                    "n": len(group),
+                    "rmse": np.sqrt((group["error"] ** 2).mean()),
+                    "mae": group["error"].abs().mean(),
+                    "bias": group["error"].mean(),
+                    "mape": group["ape"].mean(),
+                    "r2": (
+                        1 - (group["error"] ** 2).sum() / total_ss
+                        if total_ss > 0
+                        else np.nan
+                    ),
+                }
+            )
+        frames.append(pd.DataFrame(rows))
+    return pd.concat(frames, ignore_index=True)
+
+
+def check_evaluate_segments(n_rows=2000, seed=42, rtol=1e-6):
+    """
+    Compares evaluate_segments with groupby_segments on a toy frame that has
+    missing segment values and zero targets. Raises ValueError on mismatch.
+    """
+
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(
+        {
+            "district": rng.choice(["Deira", "Marina", "Hatta", None], n_rows),
+            "reg_type_en": rng.choice(["Existing Properties", "Off-Plan"], n_rows),
+            "procedure_area": rng.uniform(10, 2000, n_rows),
+            "date": pd.Timestamp("2023-01-01")
+            + pd.to_timedelta(rng.integers(0, 365, n_rows), unit="D"),
+        }
+    )
+    y_true = rng.uniform(5_000, 30_000, n_rows)
+    y_true[rng.choice(n_rows, 10, replace=False)] = 0.0
+    y_pred = y_true * rng.normal(1.0, 0.1, n_rows) + rng.normal(0, 500, n_rows)
+
+    segments = default_segments(X)
+    fast = evaluate_segments(y_true, y_pred, segments)
+    reference = groupby_segments(y_true, y_pred, segments)
+
+    merged = fast.merge(
+        reference, on=["segmentation", "segment"], how="outer", suffixes=("", "_ref")
+    )
+    if len(merged) != len(fast) or len(merged) != len(reference):
+        raise ValueError("evaluate_segments returned different segments than groupby.")
+    for metric in ["n", "rmse", "mae", "bias", "mape", "r2"]:
+        if not np.allclose(
+            merged[metric], merged[f"{metric}_ref"], rtol=rtol, equal_nan=True
+        ):
+            raise ValueError(f"evaluate_segments '{metric}' differs from groupby.")
+    if fast["mape"].isna().any():
+        raise ValueError("MAPE is NaN for a segment.")
+
+    print(f"evaluate_segments matches groupby on {len(fast)} segments.")
+    return merged
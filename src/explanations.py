@@ -0,0 +1,82 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from catboost import Pool
+
+from src.intervals import median_index, model_quantiles, point_prediction
+
+
+class PredictionExplainer:
+    """
+    Per-prediction SHAP contributions from CatBoost's native ShapValues.
+    With `worker` (an InferenceWorker) the SHAP job runs on the worker
+    thread, batched with other sessions' jobs. The price the contributions
+    are scaled to comes from the SHAP sum. Results are memoized per input
+    row, so repeated requests for the same property are free.
+    """
+
+    def __init__(self, model, worker=None, cache_size=4096):
+        self.model = model
+        self.worker = worker
+        self.feature_names = list(model.feature_names_)
+        self.cat_features = list(model.get_cat_feature_indices())
+        self.quantiles = model_quantiles(model)
+        self._explain_row = lru_cache(maxsize=cache_size)(self._explain_row)
+
+    def _shap_values(self, X):
+        if self.worker is not None:
+            return self.worker.shap_values(X, timeout=30)
+        return self.model.get_feature_importance(
+            Pool(X, cat_features=self.cat_features), type="ShapValues"
+        )
+
+    def _explain_row(self, row):
+        X = pd.DataFrame([row], columns=self.feature_names)
+        shap_values = self._shap_values(X)[0]
+
+        # Raw model output, one value per quantile for MultiQuantile
+        prediction = shap_values.sum(axis=-1)
+        if self.quantiles is not None:
+            shap_values = shap_values[median_index(self.quantiles)]
+        contributions, base_value = shap_values[:-1], shap_values[-1]
+
+        # SHAP values are additive in log1p(price). Each feature gets its
+        # share of the gap between the predicted and the base price.
+        price = np.expm1(point_prediction(prediction, self.quantiles)).item()
+        base_price = np.expm1(base_value)
+        total = contributions.sum()
+        share = contributions / total if total != 0 else np.zeros_like(contributions)
+
+        return {
+            "prediction": prediction,
+            "price_per_sqm": price,
+            "base_price_per_sqm": base_price,
+            "contributions": pd.DataFrame(
+                {
+                    "feature": self.feature_names,
+                    "value": list(row),
+                    "shap_log": contributions,
+                    "aed_per_sqm": share * (price - base_price),
+                }
+            ),
+        }
+
+    def explain(self, input_df, top_n=5):
+        """
+        Explanation of the first row of input_df: the raw prediction, the
+        price per sq.m., the base price and the `top_n` features that move
+        the price the most
+        """
+
+        row = tuple(input_df.iloc[0][self.feature_names])
+        result = dict(self._explain_row(row))
+        contributions = result["contributions"]
+        order = contributions["aed_per_sqm"].abs().sort_values(ascending=False).index
+        result["contributions"] = contributions.loc[order[:top_n]].reset_index(
+            drop=True
+        )
+        return result
+
+    def cache_info(self):
+        return self._explain_row.cache_info()
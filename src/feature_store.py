@@ -0,0 +1,282 @@
+import hashlib
+import inspect
+import json
+import os
+import shutil
+from pathlib import Path
+
+import pandas as pd
+
+from src import preprocessing
+from src.preprocessing import (
+    create_detailed_date_features,
+    categorize_transactions,
+    add_district_column,
+)
+
+
+ID_COLUMNS = [
+    "procedure_id",
+    "trans_group_id",
+    "property_type_id",
+    "property_sub_type_id",
+    "reg_type_id",
+    "area_id",
+    "project_number",
+]
+
+UNKNOWN_FILL_COLUMNS = [
+    "rooms_en",
+    "property_sub_type_en",
+    "building_name_en",
+    "project_name_en",
+    "master_project_en",
+    "nearest_landmark_en",
+    "nearest_metro_en",
+    "nearest_mall_en",
+]
+
+RENT_COLUMNS = ["rent_value", "meter_rent_price"]
+
+
+def parse_transaction_dates(df, date_col="instance_date"):
+    return pd.to_datetime(df[date_col], format="mixed", errors="coerce")
+
+
+def clean_transactions(df):
+    """
+    Cleaning steps from the notebook applied to a raw DLD Transactions frame.
+    transaction_id is kept as the row key, other ID columns are dropped.
+    """
+
+    df = df.drop(columns=[c for c in df.columns if c.endswith("_ar")])
+    df = df[df["property_usage_en"].isin(["Residential"])]
+    df = df.drop("property_usage_en", axis=1)
+
+    df["instance_date"] = parse_transaction_dates(df)
+    df = df.dropna(subset=["instance_date"])
+    df = df.rename(columns={"instance_date": "date"})
+    df = df.sort_values("date").reset_index(drop=True)
+
+    df = df.drop(columns=[c for c in ID_COLUMNS if c in df.columns])
+    for col in UNKNOWN_FILL_COLUMNS:
+        df[col] = df[col].fillna("Unknown")
+
+    df = df[~df["rooms_en"].isin(["Shop", "Office"])]
+    df = df[df["procedure_area"] >= 5]
+    df = df[~df[RENT_COLUMNS].notna().any(axis=1)]
+    df = df.drop(RENT_COLUMNS, axis=1)
+
+    return df.rename(columns={"meter_sale_price": "target"})
+
+
+def build_features(df):
+    df = clean_transactions(df)
+    df = categorize_transactions(df, column_name="procedure_name_en")
+    df = add_district_column(df, area_col_name="area_name_en", new_col_name="district")
+    df = create_detailed_date_features(df)
+    return df.reset_index(drop=True)
+
+
+def preprocessing_code_version():
+    """
+    Hash of the code that produces the stored features
+    """
+
+    source = inspect.getsource(preprocessing) + "".join(
+        inspect.getsource(f)
+        for f in (parse_transaction_dates, clean_transactions, build_features)
+    )
+    source += json.dumps([ID_COLUMNS, UNKNOWN_FILL_COLUMNS, RENT_COLUMNS])
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+
+
+class FeatureStore:
+    """
+    Cleaned, feature-engineered transactions stored as Parquet, one partition
+    per month, with a manifest describing what has been materialized
+    """
+
+    def __init__(self, root="feature_store"):
+        self.root = Path(root)
+        self.manifest_path = self.root / "manifest.json"
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        if not self.manifest_path.exists():
+            return {"code_version": None, "columns": [], "partitions": {}}
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_manifest(self):
+        tmp_path = self.manifest_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _partition_path(self, month):
+        return self.root / f"month={month}" / "part-0.parquet"
+
+    def months(self):
+        return sorted(self.manifest["partitions"])
+
+    def _read_partition(self, month, columns=None):
+        return pd.read_parquet(
+            self.root / self.manifest["partitions"][month]["path"], columns=columns
+        )
+
+    def _write_partition(self, month, part):
+        path = self._partition_path(month)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        part.to_parquet(path, index=False)
+        self.manifest["partitions"][month] = {
+            "path": str(path.relative_to(self.root)),
+            "rows": len(part),
+        }
+
+    def _merge_partition(self, month, part, key="transaction_id"):
+        """
+        Stored rows of `month` updated with `part`, matched on the key
+        """
+
+        merged = pd.concat([self._read_partition(month), part], ignore_index=True)
+        merged = merged.drop_duplicates(subset=key, keep="last")
+        return merged.sort_values("date", kind="stable").reset_index(drop=True)
+
+    def materialize(self, raw_df, rebuild=False):
+        """
+        Writes partitions for months not yet in the store. Rows of the latest
+        stored month are merged into its partition by transaction_id, since a
+        dump may have been taken mid-month and raw_df may only hold a part of
+        that month.
+        """
+
+        code_version = preprocessing_code_version()
+        stored_version = self.manifest["code_version"]
+        if self.manifest["partitions"] and stored_version != code_version:
+            if not rebuild:
+                raise ValueError(
+                    f"Feature store was built with preprocessing version "
+                    f"'{stored_version}', current is '{code_version}'. "
+                    "Run materialize with rebuild=True."
+                )
+        if rebuild:
+            for partition_dir in self.root.glob("month=*"):
+                shutil.rmtree(partition_dir)
+            self.manifest_path.unlink(missing_ok=True)
+            self.manifest = {"code_version": None, "columns": [], "partitions": {}}
+
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        raw_months = parse_transaction_dates(raw_df).dt.to_period("M").astype(str)
+        stored = self.months()
+        latest = stored[-1] if stored else None
+        months_to_write = sorted(
+            m
+            for m in raw_months.dropna().unique()
+            if m != "NaT" and (m not in stored or m == latest)
+        )
+        if not months_to_write:
+            print("Feature store is up to date.")
+            return []
+
+        features = build_features(raw_df[raw_months.isin(months_to_write)])
+        feature_months = features["date"].dt.to_period("M").astype(str)
+
+        written = []
+        for month, part in features.groupby(feature_months, sort=True):
+            if month == latest:
+                part = self._merge_partition(month, part)
+            self._write_partition(month, part)
+            written.append(month)
+
+        self.manifest["code_version"] = code_version
+        self.manifest["columns"] = list(features.columns)
+        self._write_manifest()
+        print(f"Materialized {len(written)} monthly partitions into {self.root}")
+        return written
+
+    def apply_delta(self, delta, key="transaction_id"):
+        """
+        Applies a snapshot_diff.diff_snapshot result. Changed and deleted rows
+        are removed from the months that hold them, inserted and changed rows
+        are rebuilt and written to their months. Only touched partitions are
+        rewritten.
+        """
+
+        code_version = preprocessing_code_version()
+        stored_version = self.manifest["code_version"]
+        if self.manifest["partitions"] and stored_version != code_version:
+            raise ValueError(
+                f"Feature store was built with preprocessing version "
+                f"'{stored_version}', current is '{code_version}'. "
+                "Run materialize with rebuild=True."
+            )
+
+        upserts = pd.concat([delta["inserted"], delta["changed"]], ignore_index=True)
+        removed = pd.Index(delta["changed"][key]).append(pd.Index(delta["deleted"]))
+
+        new_parts = {}
+        if len(upserts):
+            features = build_features(upserts)
+            feature_months = features["date"].dt.to_period("M").astype(str)
+            new_parts = dict(list(features.groupby(feature_months, sort=True)))
+            self.manifest["columns"] = list(features.columns)
+
+        # A changed row may have moved to another month, so the old location
+        # of every removed key is looked up in the stored partitions
+        touched = set(new_parts)
+        if len(removed):
+            for month in self.months():
+                keys = self._read_partition(month, columns=[key])[key]
+                if keys.isin(removed).any():
+                    touched.add(month)
+
+        if not touched:
+            print("Feature store is up to date.")
+            return []
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        for month in sorted(touched):
+            parts = []
+            if month in self.manifest["partitions"]:
+                stored = self._read_partition(month)
+                parts.append(stored[~stored[key].isin(removed)])
+            if month in new_parts:
+                parts.append(new_parts[month])
+            part = pd.concat(parts, ignore_index=True)
+            part = part.sort_values("date", kind="stable").reset_index(drop=True)
+
+            if part.empty:
+                shutil.rmtree(self._partition_path(month).parent)
+                del self.manifest["partitions"][month]
+            else:
+                self._write_partition(month, part)
+
+        self.manifest["code_version"] = code_version
+        self._write_manifest()
+        print(f"Rewrote {len(touched)} monthly partitions in {self.root}")
+        return sorted(touched)
+
+    def iter_partitions(self, columns=None, start=None, end=None):
+        """
+        Yields the partitions between `start` and `end` (inclusive,
+        'YYYY-MM') one month at a time, with only the requested columns
+        """
+
+        months = [
+            m
+            for m in self.months()
+            if (start is None or m >= start) and (end is None or m <= end)
+        ]
+        if not months:
+            raise ValueError(f"No partitions found between {start} and {end}.")
+
+        for m in months:
+            yield self._read_partition(m, columns=columns)
+
+    def load(self, columns=None, start=None, end=None):
+        return pd.concat(
+            self.iter_partitions(columns=columns, start=start, end=end),
+            ignore_index=True,
+        )
@@ -0,0 +1,221 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from catboost import Pool
+
+from src.explanations import PredictionExplainer
+
+
+class InferenceWorker:
+    """
+    Single background thread that owns all model.predict calls. Sessions
+    submit input frames to a bounded queue; requests that arrive together
+    are merged into one batch and scored with a fixed CatBoost thread count.
+    SHAP jobs go through the same queue and are batched the same way.
+    Implements predict and get_all_params, so it can be used in place of
+    the model, e.g. in predict_sweep.
+    """
+
+    def __init__(
+        self,
+        model,
+        thread_count=2,
+        max_batch_rows=512,
+        max_wait_ms=2.0,
+        max_queue_size=256,
+    ):
+        self.model = model
+        self.thread_count = thread_count
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000
+        self._cat_features = list(model.get_cat_feature_indices())
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._held = None
+        self._thread = threading.Thread(
+            target=self._run, name="inference-worker", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, X, job="predict", timeout=1.0):
+        """
+        Queues X for scoring and returns a Future with its predictions, or
+        with its SHAP values for job="shap_values". Raises RuntimeError if
+        the queue stays full for `timeout` seconds.
+        """
+
+        if job not in ("predict", "shap_values"):
+            raise ValueError(f"Unknown job '{job}'.")
+        future = Future()
+        try:
+            self._queue.put((job, X, future), timeout=timeout)
+        except queue.Full:
+            raise RuntimeError("Inference queue is full, please try again.")
+        return future
+
+    def predict(self, X, timeout=None):
+        return self.submit(X).result(timeout=timeout)
+
+    def shap_values(self, X, timeout=None):
+        """
+        CatBoost ShapValues of X: per row the feature contributions followed
+        by the expected value, one such vector per output for MultiQuantile
+        """
+
+        return self.submit(X, job="shap_values").result(timeout=timeout)
+
+    def get_all_params(self):
+        return self.model.get_all_params()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _next_item(self):
+        if self._held is not None:
+            item, self._held = self._held, None
+            return item
+        return self._queue.get()
+
+    def _collect_batch(self, first):
+        """
+        Jobs of the same kind as `first` arriving within max_wait of it. A
+        job of another kind ends the batch and is held for the next round,
+        so at most one job is ever outside the bounded queue.
+        """
+
+        batch, n_rows = [first], len(first[1])
+        deadline = time.perf_counter() + self.max_wait
+        while n_rows < self.max_batch_rows:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=max(remaining, 0))
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            if item[0] != first[0]:
+                self._held = item
+                break
+            batch.append(item)
+            n_rows += len(item[1])
+        return batch
+
+    def _score(self, job, X):
+        if job == "predict":
+            return self.model.predict(X, thread_count=self.thread_count)
+        return self.model.get_feature_importance(
+            Pool(X, cat_features=self._cat_features),
+            type="ShapValues",
+            thread_count=self.thread_count,
+        )
+
+    def _run_batch(self, batch):
+        """
+        Scores the batch in one call and splits the result by request. If
+        that fails, each request is retried on its own, so only the request
+        that breaks it gets the exception.
+        """
+
+        job = batch[0][0]
+        try:
+            X = pd.concat([X for _, X, _ in batch], ignore_index=True)
+            result = self._score(job, X)
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][2].set_exception(e)
+                return
+            for item in batch:
+                self._run_batch([item])
+            return
+
+        start = 0
+        for _, X_part, future in batch:
+            end = start + len(X_part)
+            future.set_result(result[start:end])
+            start = end
+
+    def _run(self):
+        while True:
+            first = self._next_item()
+            if first is None:
+                return
+            self._run_batch(self._collect_batch(first))
+
+
+def run_load_test(predict, make_request, n_clients=50, requests_per_client=20):
+    """
+    n_clients threads each send `requests_per_client` sequential requests
+    through `predict`, like concurrent app sessions. Returns latency
+    percentiles in milliseconds and throughput.
+    """
+
+    def client(client_id):
+        latencies = []
+        for i in range(requests_per_client):
+            X = make_request(client_id, i)
+            start = time.perf_counter()
+            predict(X)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_clients) as executor:
+        results = list(executor.map(client, range(n_clients)))
+    wall = time.perf_counter() - start
+
+    latencies = 1000 * np.concatenate(results)
+    return {
+        "clients": n_clients,
+        "requests": len(latencies),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "requests_per_s": len(latencies) / wall,
+    }
+
+
+def _with_explanation(predict, explainer):
+    def request(X):
+        predict(X)
+        explainer.explain(X)
+
+    return request
+
+
+def compare_direct_and_worker(
+    model, make_request, n_clients=50, explain=False, **worker_kwargs
+):
+    """
+    Load test of every session calling the model directly versus all
+    sessions going through one InferenceWorker. With explain=True each
+    request is what a "Predict Price" click does in the app: a predict and
+    an uncached explanation.
+    """
+
+    direct = model.predict
+    if explain:
+        direct = _with_explanation(direct, PredictionExplainer(model, cache_size=0))
+    results = {"direct": run_load_test(direct, make_request, n_clients)}
+
+    worker = InferenceWorker(model, **worker_kwargs)
+    try:
+        predict = worker.predict
+        if explain:
+            predict = _with_explanation(
+                predict, PredictionExplainer(model, worker=worker, cache_size=0)
+            )
+        results["worker"] = run_load_test(predict, make_request, n_clients)
+    finally:
+        worker.close()
+
+    for label, r in results.items():
+        print(
+            f"{label:>7}: p50 {r['p50_ms']:.2f} ms, p95 {r['p95_ms']:.2f} ms, "
+            f"p99 {r['p99_ms']:.2f} ms, {r['requests_per_s']:.0f} req/s"
+        )
+    return pd.DataFrame(results).T
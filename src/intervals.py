@@ -0,0 +1,89 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+QUANTILES = (0.1, 0.5, 0.9)
+
+
+def multi_quantile_loss(quantiles=QUANTILES):
+    return "MultiQuantile:alpha=" + ",".join(str(q) for q in quantiles)
+
+
+def model_quantiles(model):
+    """
+    Quantiles a CatBoost model was trained for, None for a point model
+    """
+
+    loss = model.get_all_params().get("loss_function", "")
+    if not loss.startswith("MultiQuantile"):
+        return None
+    alphas = loss.split("alpha=")[1].split(";")[0]
+    return [float(a) for a in alphas.split(",")]
+
+
+def quantile_column(q):
+    return f"p{round(q * 100)}"
+
+
+def to_price_quantiles(prediction, quantiles):
+    """
+    Back-transforms log1p quantile predictions of shape (n, len(quantiles))
+    to price. Rows are sorted so the quantiles never cross.
+    """
+
+    prices = np.expm1(np.sort(np.atleast_2d(prediction), axis=1))
+    return pd.DataFrame(prices, columns=[quantile_column(q) for q in quantiles])
+
+
+def median_index(quantiles):
+    return int(np.argmin(np.abs(np.asarray(quantiles) - 0.5)))
+
+
+def point_prediction(prediction, quantiles):
+    """
+    Log-scale point prediction: the model output itself for a point model,
+    the median of the sorted quantiles for a quantile model, so it always
+    matches the pXX column of to_price_quantiles and stays inside the range
+    """
+
+    if quantiles is None:
+        return prediction
+    return np.sort(np.atleast_2d(prediction), axis=1)[:, median_index(quantiles)]
+
+
+def interval_metrics(y_true, price_quantiles, lower="p10", upper="p90"):
+    y_true = np.asarray(y_true, dtype=float)
+    low = price_quantiles[lower].to_numpy()
+    high = price_quantiles[upper].to_numpy()
+    return {
+        f"test_coverage_{lower}_{upper}": float(
+            np.mean((y_true >= low) & (y_true <= high))
+        ),
+        f"test_mean_width_{lower}_{upper}": float(np.mean(high - low)),
+    }
+
+
+def benchmark_predict_latency(models, X, n_repeats=50):
+    """
+    Median latency of one predict call on a single row and on all of X for
+    each model in `models` (label -> model)
+    """
+
+    results = {}
+    for label, model in models.items():
+        timings = {}
+        for name, data in (("one_row", X.iloc[:1]), ("batch", X)):
+            model.predict(data)
+            runs = []
+            for _ in range(n_repeats):
+                start = time.perf_counter()
+                model.predict(data)
+                runs.append(time.perf_counter() - start)
+            timings[f"{name}_ms"] = 1000 * float(np.median(runs))
+        results[label] = timings
+        print(
+            f"{label:>10}: 1 row {timings['one_row_ms']:.3f} ms, "
+            f"{len(X)} rows {timings['batch_ms']:.1f} ms"
+        )
+    return pd.DataFrame(results).T
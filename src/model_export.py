@@ -1,6 +1,124 @@
+import json
+import os
+import time
+
+import numpy as np
 import mlflow
 import mlflow.catboost
+from catboost import CatBoostRegressor
 from mlflow.tracking import MlflowClient
+from sklearn.metrics import mean_squared_error
+
+from src.intervals import model_quantiles, point_prediction
+from src.registry import RunRegistry, resolve_tracking_uri
+
+
+def build_feature_schema(model, X_reference=None):
+    """
+    Exact input layout of the model, plus the categorical vocabularies seen
+    in `X_reference` and the features the trees never split on
+    """
+
+    feature_names = list(model.feature_names_)
+    cat_indices = set(model.get_cat_feature_indices())
+    importances = model.get_feature_importance()
+
+    features = []
+    for i, name in enumerate(feature_names):
+        feature = {
+            "name": name,
+            "type": "categorical" if i in cat_indices else "numeric",
+            "importance": float(importances[i]),
+        }
+        if X_reference is not None and name in X_reference.columns:
+            feature["dtype"] = str(X_reference[name].dtype)
+            if i in cat_indices:
+                feature["vocabulary"] = sorted(
+                    str(v) for v in X_reference[name].dropna().unique()
+                )
+        features.append(feature)
+
+    return {
+        "feature_order": feature_names,
+        "features": features,
+        "zero_importance_features": [
+            f["name"] for f in features if f["importance"] == 0
+        ],
+        "tree_count": int(model.tree_count_),
+    }
+
+
+def retrain_without_features(model, X_train, y_train, features):
+    """
+    Refits `model` with the same params and tree count, with `features`
+    ignored. CatBoost keeps the input layout, so callers pass the same
+    columns, but the trees and the per-row feature computation skip them.
+    y_train is on the original price scale.
+    """
+
+    feature_names = list(model.feature_names_)
+    params = {
+        **model.get_params(),
+        "iterations": model.tree_count_,
+        "cat_features": [feature_names[i] for i in model.get_cat_feature_indices()],
+        "ignored_features": [feature_names.index(f) for f in features],
+        "verbose": 0,
+    }
+    retrained = CatBoostRegressor(**params)
+    retrained.fit(X_train[feature_names], np.log1p(y_train))
+    return retrained
+
+
+def benchmark_exports(plain_path, serving_path, X_holdout, y_holdout, n_repeats=20):
+    """
+    Load time, file size, predict latency and holdout RMSE of two exported
+    models. y_holdout is on the original price scale, models predict log1p;
+    quantile models are scored on their median.
+    """
+
+    results = {}
+    for label, path in (("plain", plain_path), ("serving", serving_path)):
+        load_times = []
+        for _ in range(n_repeats):
+            start = time.perf_counter()
+            model = CatBoostRegressor()
+            model.load_model(path)
+            load_times.append(time.perf_counter() - start)
+
+        single_row = X_holdout.iloc[:1]
+        model.predict(single_row)
+        row_times = []
+        for _ in range(n_repeats):
+            start = time.perf_counter()
+            model.predict(single_row)
+            row_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        prediction = model.predict(X_holdout)
+        batch_time = time.perf_counter() - start
+        y_pred = np.expm1(point_prediction(prediction, model_quantiles(model)))
+
+        results[label] = {
+            "file_size_mb": os.path.getsize(path) / 1024**2,
+            "load_ms": 1000 * float(np.median(load_times)),
+            "predict_one_row_ms": 1000 * float(np.median(row_times)),
+            "predict_holdout_ms": 1000 * batch_time,
+            "holdout_rmse": float(np.sqrt(mean_squared_error(y_holdout, y_pred))),
+        }
+
+    results["rmse_delta"] = (
+        results["serving"]["holdout_rmse"] - results["plain"]["holdout_rmse"]
+    )
+
+    for label in ("plain", "serving"):
+        r = results[label]
+        print(
+            f"{label:>8}: {r['file_size_mb']:.2f} MB, load {r['load_ms']:.1f} ms, "
+            f"1 row {r['predict_one_row_ms']:.2f} ms, "
+            f"holdout {r['predict_holdout_ms']:.1f} ms, RMSE {r['holdout_rmse']:.2f}"
+        )
+    print(f"Holdout RMSE delta (serving - plain): {results['rmse_delta']:.4f}")
+    return results
 
 
 class ModelExporter:
@@ -9,14 +127,22 @@ class ModelExporter:
         experiment_name="CatBoost_Dubai_Real_Estate",
         model_run_name="dubai_catboost_v11",
         model_base_name="catboost_dubai_property_model",
+        tracking_uri=None,
+        registry_path=None,
     ):
         self.experiment_name = experiment_name
         self.model_run_name = model_run_name
         self.model_base_name = model_base_name
-        mlflow.set_tracking_uri("file:///Users/vitalyboldyrev/real_estate_uae/mlruns")
+        self.tracking_uri = resolve_tracking_uri(tracking_uri)
+        mlflow.set_tracking_uri(self.tracking_uri)
         self.client = MlflowClient()
+        self.registry = RunRegistry(self.tracking_uri, registry_path)
 
     def get_run_id_by_run_name(self):
+        entry = self.registry.get_run(self.experiment_name, self.model_run_name)
+        if entry is not None:
+            return entry["run_id"]
+
         experiment = self.client.get_experiment_by_name(self.experiment_name)
         if experiment is None:
             raise ValueError(f"Experiment '{self.experiment_name}' not found.")
@@ -31,14 +157,81 @@ class ModelExporter:
         if not runs:
             raise ValueError(f"No run found with name '{self.model_run_name}'.")
 
-        return runs[0].info.run_id
+        run_id = runs[0].info.run_id
+        self.registry.record_run(
+            self.experiment_name,
+            self.model_run_name,
+            run_id,
+            metrics=runs[0].data.metrics,
+        )
+        return run_id
 
-    def export_model(self, output_path="dubai_model_v11.cbm"):
+    def load_model(self):
         run_id = self.get_run_id_by_run_name()
         print(f"Found run_id: {run_id} for model name '{self.model_run_name}'")
 
         model_uri = f"runs:/{run_id}/{self.model_base_name}"
-        model = mlflow.catboost.load_model(model_uri)
+        return mlflow.catboost.load_model(model_uri)
+
+    def export_model(self, output_path="dubai_model_v11.cbm"):
+        model = self.load_model()
 
         model.save_model(output_path)
         print(f"Model exported to: {output_path}")
+
+    def export_serving_model(
+        self,
+        output_path="dubai_model_v11_serving.cbm",
+        X_reference=None,
+        X_holdout=None,
+        y_holdout=None,
+        ntree_end=None,
+        X_train=None,
+        y_train=None,
+    ):
+        """
+        Exports a model tuned for inference, with its feature schema written
+        next to it as <output_path>.schema.json. The model is cut to
+        `ntree_end` trees, its best iteration by default when one was
+        recorded. Given X_train and y_train (price scale) it is retrained
+        with the features its trees never split on ignored. When a holdout
+        is given the result is benchmarked against the plain export.
+        """
+
+        model = self.load_model()
+        plain_tree_count = model.tree_count_
+
+        plain_path = None
+        if X_holdout is not None and y_holdout is not None:
+            plain_path = f"{output_path}.plain.cbm"
+            model.save_model(plain_path)
+
+        if ntree_end is None and model.get_best_iteration() is not None:
+            ntree_end = model.get_best_iteration() + 1
+        if ntree_end is not None and ntree_end < plain_tree_count:
+            model.shrink(ntree_end=ntree_end)
+            print(f"Shrunk from {plain_tree_count} to {model.tree_count_} trees.")
+        elif ntree_end is None:
+            print("Model has no best iteration and no ntree_end, keeping all trees.")
+
+        unused = build_feature_schema(model)["zero_importance_features"]
+        if unused and X_train is not None and y_train is not None:
+            print(f"Retraining with unused features ignored: {unused}")
+            model = retrain_without_features(model, X_train, y_train, unused)
+        elif unused:
+            print(f"Unused features (pass X_train to drop them): {unused}")
+
+        schema = build_feature_schema(model, X_reference)
+        model.save_model(output_path)
+        schema_path = f"{output_path}.schema.json"
+        with open(schema_path, "w", encoding="utf-8") as f:
+            json.dump(schema, f, indent=2, ensure_ascii=False)
+        print(f"Serving model exported to: {output_path}, schema: {schema_path}")
+
+        if plain_path is None:
+            return None
+
+        try:
+            return benchmark_exports(plain_path, output_path, X_holdout, y_holdout)
+        finally:
+            os.remove(plain_path)
@@ -0,0 +1,249 @@
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from catboost import CatBoostRegressor, Pool
+
+from src.feature_store import FeatureStore
+
+# Never appears in the written values, so the csv writer doesn't try to
+# escape the '"' in names like Tower "A" under QUOTE_NONE
+POOL_QUOTECHAR = "\x1f"
+
+
+def to_pool_frame(df, feature_cols, cat_features):
+    """
+    Features in the form CatBoost reads from a file: categories as clean
+    strings, dates as int64 nanoseconds (what CatBoost uses for datetime64).
+    Quotes are kept as they are, CatBoost reads them literally with
+    ignore_csv_quoting.
+    """
+
+    df = df[feature_cols].copy()
+    for col in feature_cols:
+        if col in cat_features:
+            df[col] = (
+                df[col]
+                .astype(str)
+                .str.replace(r"[\t\r\n]", " ", regex=True)
+                .str.replace(POOL_QUOTECHAR, "", regex=False)
+            )
+        elif pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].astype("int64")
+    return df
+
+
+def write_column_description(cd_path, feature_cols, cat_features):
+    with open(cd_path, "w", encoding="utf-8") as f:
+        f.write("0\tLabel\n")
+        for i, col in enumerate(feature_cols, start=1):
+            col_type = "Categ" if col in cat_features else "Num"
+            f.write(f"{i}\t{col_type}\t{col}\n")
+
+
+def write_pool_file(
+    chunks, data_path, feature_cols, cat_features, target_col="target", log_target=True
+):
+    """
+    Appends each chunk to a TSV pool file, so only one chunk is in memory
+    """
+
+    n_rows = 0
+    with open(data_path, "w", encoding="utf-8", newline="") as f:
+        for chunk in chunks:
+            target = chunk[target_col].to_numpy(dtype=float)
+            part = to_pool_frame(chunk, feature_cols, cat_features)
+            part.insert(0, target_col, np.log1p(target) if log_target else target)
+            part.to_csv(
+                f,
+                sep="\t",
+                header=False,
+                index=False,
+                quoting=csv.QUOTE_NONE,
+                quotechar=POOL_QUOTECHAR,
+                na_rep="nan",
+            )
+            n_rows += len(part)
+    return n_rows
+
+
+def build_quantized_pool(
+    chunks,
+    output_path,
+    feature_cols,
+    cat_features,
+    target_col="target",
+    log_target=True,
+    border_count=128,
+    work_dir=None,
+):
+    """
+    Streams chunks into a temporary TSV pool, so the history never exists as
+    a DataFrame of object columns, then lets CatBoost read and quantize it.
+    The quantized pool is saved to `output_path` and can be read back with
+    Pool("quantized://<path>"); its border count goes to
+    <output_path>.meta.json.
+
+    This is not out-of-core: CatBoost loads the whole raw pool (float32
+    values and hashed categories) before quantizing, so peak memory still
+    grows with the number of rows, only slower than with pandas.
+    """
+
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp_dir:
+        data_path = os.path.join(tmp_dir, "pool.tsv")
+        cd_path = os.path.join(tmp_dir, "pool.cd")
+        write_column_description(cd_path, feature_cols, cat_features)
+        n_rows = write_pool_file(
+            chunks, data_path, feature_cols, cat_features, target_col, log_target
+        )
+
+        # catboost.utils.quantize streams the file in blocks but does not
+        # support categorical features, so the file is read into a raw Pool
+        # (float32 values and hashed categories) and quantized in place.
+        pool = Pool(data_path, column_description=cd_path, ignore_csv_quoting=True)
+        pool.quantize(border_count=border_count)
+        pool.save(str(output_path))
+        del pool
+
+    with open(f"{output_path}.meta.json", "w", encoding="utf-8") as f:
+        json.dump({"border_count": border_count, "rows": n_rows}, f, indent=2)
+
+    print(f"Quantized pool with {n_rows} rows saved to {output_path}")
+    return output_path
+
+
+def load_quantized_pool(path):
+    return Pool(f"quantized://{path}")
+
+
+def quantized_pool_border_count(path):
+    """
+    Border count the pool was quantized with, None if it has no metadata
+    """
+
+    meta_path = f"{path}.meta.json"
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f)["border_count"]
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB. VmHWM is used where
+    available because ru_maxrss carries over the parent's peak across fork
+    and exec. NaN on Windows, which has neither.
+    """
+
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def _train_history_window(
+    queue, store_root, start, end, feature_cols, cat_features, params, mode
+):
+    wall_start = time.perf_counter()
+    store = FeatureStore(store_root)
+    columns = feature_cols + ["target"]
+
+    if mode == "quantized":
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pool_path = Path(tmp_dir) / "train.quantized"
+            build_quantized_pool(
+                store.iter_partitions(columns=columns, start=start, end=end),
+                pool_path,
+                feature_cols,
+                cat_features,
+                border_count=params.get("border_count", 128),
+            )
+            pool = load_quantized_pool(pool_path)
+            n_rows = pool.num_row()
+            # Borders were fixed when the pool was quantized
+            fit_params = {k: v for k, v in params.items() if k != "border_count"}
+            CatBoostRegressor(**fit_params, verbose=0).fit(pool)
+    else:
+        df = store.load(columns=columns, start=start, end=end)
+        n_rows = len(df)
+        CatBoostRegressor(**params, cat_features=cat_features, verbose=0).fit(
+            df[feature_cols], np.log1p(df["target"])
+        )
+
+    queue.put(
+        {
+            "start": start,
+            "end": end,
+            "mode": mode,
+            "rows": n_rows,
+            "wall_seconds": time.perf_counter() - wall_start,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+    )
+
+
+def benchmark_history_windows(
+    store_root,
+    windows,
+    feature_cols,
+    cat_features,
+    params=None,
+    modes=("in_memory", "quantized"),
+):
+    """
+    Peak RSS and wall time of training over growing history windows, from
+    a DataFrame versus from a quantized pool file.
+    Each (window, mode) runs in a fresh process so peak RSS is its own.
+    `windows` is a list of (start, end) month pairs, e.g. ("2018-01", None).
+    """
+
+    params = params or {"iterations": 200, "depth": 6, "thread_count": -1}
+    ctx = multiprocessing.get_context("spawn")
+
+    results = []
+    for start, end in windows:
+        for mode in modes:
+            queue = ctx.Queue()
+            process = ctx.Process(
+                target=_train_history_window,
+                args=(
+                    queue,
+                    store_root,
+                    start,
+                    end,
+                    feature_cols,
+                    cat_features,
+                    params,
+                    mode,
+                ),
+            )
+            process.start()
+            process.join()
+            if process.exitcode != 0:
+                raise RuntimeError(f"Training {mode} on {start}..{end} failed.")
+            result = queue.get()
+            results.append(result)
+            print(
+                f"{start}..{end or 'latest'} {mode:>9}: {result['rows']:>10,} rows, "
+                f"{result['wall_seconds']:7.1f}s, peak RSS {result['peak_rss_mb']:8.0f} MB"
+            )
+
+    return pd.DataFrame(results)
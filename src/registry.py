@@ -0,0 +1,99 @@
+import json
+import os
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def resolve_tracking_uri(tracking_uri=None):
+    """
+    Explicit URI, then MLFLOW_TRACKING_URI, then the repo's mlruns directory
+    """
+
+    if tracking_uri:
+        return tracking_uri
+    return os.environ.get("MLFLOW_TRACKING_URI", (BASE_DIR / "mlruns").as_uri())
+
+
+class RunRegistry:
+    """
+    Local JSON manifest of logged runs, keyed by tracking URI, experiment
+    and run name, so version resolution and export lookups don't scan the
+    tracking store. Each tracking store gets its own section, so pointing
+    MLFLOW_TRACKING_URI elsewhere never returns runs from another store.
+    """
+
+    def __init__(self, tracking_uri, path=None):
+        self.tracking_uri = tracking_uri
+        self.path = Path(path or BASE_DIR / "run_registry.json")
+        self.data = self._read()
+        stores = self.data.setdefault("stores", {})
+        self.store = stores.setdefault(tracking_uri, {"experiments": {}})
+
+    def _read(self):
+        if not self.path.exists():
+            return {"stores": {}}
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def _experiment(self, experiment_name):
+        return self.store["experiments"].setdefault(
+            experiment_name, {"runs": {}, "latest_versions": {}}
+        )
+
+    def record_run(
+        self,
+        experiment_name,
+        run_name,
+        run_id,
+        model_base_name=None,
+        version=None,
+        artifact_path=None,
+        metrics=None,
+    ):
+        experiment = self._experiment(experiment_name)
+        experiment["runs"][run_name] = {
+            "run_id": run_id,
+            "model_base_name": model_base_name,
+            "version": version,
+            "artifact_path": artifact_path,
+            "metrics": metrics or {},
+        }
+        if model_base_name is not None and version is not None:
+            latest = experiment["latest_versions"].get(model_base_name, 0)
+            experiment["latest_versions"][model_base_name] = max(latest, version)
+        self._write()
+
+    def get_run(self, experiment_name, run_name):
+        return (
+            self.store["experiments"]
+            .get(experiment_name, {})
+            .get("runs", {})
+            .get(run_name)
+        )
+
+    def latest_version(self, experiment_name, model_base_name):
+        return (
+            self.store["experiments"]
+            .get(experiment_name, {})
+            .get("latest_versions", {})
+            .get(model_base_name)
+        )
+
+    def latest_run(self, experiment_name, model_base_name):
+        version = self.latest_version(experiment_name, model_base_name)
+        runs = self.store["experiments"].get(experiment_name, {}).get("runs", {})
+        for entry in runs.values():
+            if (
+                entry["model_base_name"] == model_base_name
+                and entry["version"] == version
+            ):
+                return entry
+        return None
@@ -0,0 +1,347 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+# Columns of the DLD Transactions dump besides transaction_id
+SNAPSHOT_COLUMNS = [
+    "procedure_id",
+    "trans_group_id",
+    "trans_group_ar",
+    "trans_group_en",
+    "procedure_name_ar",
+    "procedure_name_en",
+    "instance_date",
+    "property_type_id",
+    "property_type_ar",
+    "property_type_en",
+    "property_sub_type_id",
+    "property_sub_type_ar",
+    "property_sub_type_en",
+    "property_usage_ar",
+    "property_usage_en",
+    "reg_type_id",
+    "reg_type_ar",
+    "reg_type_en",
+    "area_id",
+    "area_name_ar",
+    "area_name_en",
+    "building_name_ar",
+    "building_name_en",
+    "project_number",
+    "project_name_ar",
+    "project_name_en",
+    "master_project_en",
+    "master_project_ar",
+    "nearest_landmark_ar",
+    "nearest_landmark_en",
+    "nearest_metro_ar",
+    "nearest_metro_en",
+    "nearest_mall_ar",
+    "nearest_mall_en",
+    "rooms_ar",
+    "rooms_en",
+    "has_parking",
+    "procedure_area",
+    "actual_worth",
+    "meter_sale_price",
+    "rent_value",
+    "meter_rent_price",
+    "no_of_parties_role_1",
+    "no_of_parties_role_2",
+    "no_of_parties_role_3",
+]
+
+
+def canonicalize(df, columns):
+    """
+    `columns` in a fixed order with dtypes that don't depend on what read_csv
+    inferred: numbers as float64, so an int column that gains a NaN hashes
+    the same, and everything else as strings
+    """
+
+    missing = [c for c in columns if c not in df.columns]
+    if missing:
+        raise ValueError(f"Snapshot is missing columns: {missing}")
+
+    canonical = {}
+    for col in columns:
+        values = df[col]
+        if pd.api.types.is_numeric_dtype(values):
+            canonical[col] = values.astype("float64")
+        else:
+            canonical[col] = values.astype("string")
+    return pd.DataFrame(canonical, columns=columns)
+
+
+def iter_chunks(snapshot, chunk_rows=500_000):
+    """
+    Row blocks of a DataFrame, or the frames of an iterable as they come,
+    e.g. pd.read_csv(..., chunksize=...)
+    """
+
+    if isinstance(snapshot, pd.DataFrame):
+        for start in range(0, len(snapshot), chunk_rows):
+            yield snapshot.iloc[start : start + chunk_rows]
+    else:
+        yield from snapshot
+
+
+def hash_rows(snapshot, columns=None, key="transaction_id", chunk_rows=500_000):
+    """
+    64-bit hash of each row over `columns` (SNAPSHOT_COLUMNS by default),
+    indexed by the key column. The snapshot is canonicalized one chunk at a
+    time, so only a chunk's copy of the text columns is held at once.
+    """
+
+    if columns is None:
+        columns = SNAPSHOT_COLUMNS
+
+    keys, hashes = [], []
+    for chunk in iter_chunks(snapshot, chunk_rows):
+        # A copy, a view would keep the whole chunk's object block alive
+        keys.append(chunk[key].to_numpy(copy=True))
+        hashes.append(
+            pd.util.hash_pandas_object(
+                canonicalize(chunk, columns), index=False
+            ).to_numpy()
+        )
+    if not keys:
+        raise ValueError("Snapshot is empty.")
+
+    return pd.Series(
+        np.concatenate(hashes),
+        index=pd.Index(np.concatenate(keys), name=key),
+        name="row_hash",
+    )
+
+
+def save_hash_index(hash_index, path):
+    hash_index.reset_index().to_parquet(path, index=False)
+
+
+def load_hash_index(path, key="transaction_id"):
+    return pd.read_parquet(path).set_index(key)["row_hash"]
+
+
+def diff_snapshot(
+    snapshot,
+    previous_index=None,
+    columns=None,
+    key="transaction_id",
+    chunk_rows=500_000,
+):
+    """
+    Compares a full snapshot, a DataFrame or an iterable of chunks, against
+    the previous snapshot's hash index. Only the hashes and the rows that
+    differ are kept across chunks.
+
+    Returns a dict with the inserted and changed rows, the keys of deleted
+    rows and the hash index of the new snapshot. Of rows with a duplicated
+    key the last one wins.
+    """
+
+    has_previous = previous_index is not None and not previous_index.empty
+    if has_previous:
+        previous_hashes = previous_index.to_numpy()
+        seen = np.zeros(len(previous_index), dtype=bool)
+
+    index_parts, candidates = [], []
+    for chunk in iter_chunks(snapshot, chunk_rows):
+        chunk_index = hash_rows(chunk, columns=columns, key=key)
+        hashes = chunk_index.to_numpy()
+        index_parts.append(chunk_index)
+
+        is_candidate = np.ones(len(chunk), dtype=bool)
+        if has_previous:
+            positions = previous_index.index.get_indexer(chunk_index.index)
+            matched = positions >= 0
+            seen[positions[matched]] = True
+            is_candidate[matched] = (
+                previous_hashes[positions[matched]] != hashes[matched]
+            )
+        candidates.append(chunk[is_candidate].assign(_row_hash=hashes[is_candidate]))
+
+    if not index_parts:
+        raise ValueError("Snapshot is empty.")
+
+    current_index = pd.concat(index_parts)
+    duplicated = current_index.index.duplicated(keep="last")
+    if duplicated.any():
+        print(f"Dropping {duplicated.sum()} rows with duplicated {key}.")
+        current_index = current_index[~duplicated]
+
+    # A row only counts if it is the last one of its key
+    rows = pd.concat(candidates, ignore_index=True)
+    is_last = (
+        rows["_row_hash"].to_numpy() == current_index.reindex(rows[key]).to_numpy()
+    )
+    rows = rows[is_last].drop_duplicates(subset=key, keep="last")
+    rows = rows.drop(columns="_row_hash").reset_index(drop=True)
+
+    if not has_previous:
+        return {
+            "inserted": rows,
+            "changed": rows.iloc[:0],
+            "deleted": pd.Index([], name=key),
+            "hash_index": current_index,
+        }
+
+    is_inserted = previous_index.index.get_indexer(rows[key]) < 0
+    return {
+        "inserted": rows[is_inserted],
+        "changed": rows[~is_inserted],
+        "deleted": previous_index.index[~seen],
+        "hash_index": current_index,
+    }
+
+
+FLOAT_COLUMNS = {
+    "property_sub_type_id",
+    "project_number",
+    "procedure_area",
+    "actual_worth",
+    "meter_sale_price",
+    "rent_value",
+    "meter_rent_price",
+    "no_of_parties_role_1",
+    "no_of_parties_role_2",
+    "no_of_parties_role_3",
+}
+
+INT_COLUMNS = {
+    "procedure_id",
+    "trans_group_id",
+    "property_type_id",
+    "reg_type_id",
+    "area_id",
+    "has_parking",
+}
+
+# Rough number of distinct values of the high-cardinality text columns
+STRING_CARDINALITY = {
+    "instance_date": 6000,
+    "building_name_ar": 5000,
+    "building_name_en": 5000,
+    "project_name_ar": 2000,
+    "project_name_en": 2000,
+    "master_project_ar": 100,
+    "master_project_en": 100,
+    "area_name_ar": 300,
+    "area_name_en": 300,
+}
+
+
+def synthetic_snapshot(n_rows, seed=42, first_id=0):
+    """
+    Random frame with the DLD Transactions schema as read_csv returns it:
+    string transaction_id, int and float columns, and object text columns
+    with about 10% missing values
+    """
+
+    rng = np.random.default_rng(seed)
+    data = {
+        "transaction_id": np.array(
+            [f"1-{first_id + i}-2024" for i in range(n_rows)], dtype=object
+        )
+    }
+    for col in SNAPSHOT_COLUMNS:
+        if col in FLOAT_COLUMNS:
+            data[col] = rng.uniform(0, 1e6, n_rows)
+        elif col in INT_COLUMNS:
+            data[col] = rng.integers(0, 300, n_rows)
+        else:
+            cardinality = STRING_CARDINALITY.get(col, 30)
+            vocabulary = np.array(
+                [f"{col} {i}" for i in range(cardinality)] + [None], dtype=object
+            )
+            probabilities = np.full(cardinality + 1, 0.9 / cardinality)
+            probabilities[-1] = 0.1
+            data[col] = vocabulary[rng.choice(cardinality + 1, n_rows, p=probabilities)]
+    return pd.DataFrame(data)
+
+
+def synthetic_snapshot_chunks(n_rows, chunk_rows=500_000, change_frac=None, seed=42):
+    """
+    synthetic_snapshot generated and yielded one chunk at a time, like a
+    dump read with chunksize. With `change_frac`, that share of each chunk's
+    rows gets a new transaction_id (a deleted and an inserted row) and as
+    many other rows get a new actual_worth.
+    """
+
+    for i, start in enumerate(range(0, n_rows, chunk_rows)):
+        chunk = synthetic_snapshot(
+            min(chunk_rows, n_rows - start), seed=seed + i, first_id=start
+        )
+        if change_frac:
+            n_delta = int(len(chunk) * change_frac)
+            chunk.iloc[
+                n_delta : 2 * n_delta, chunk.columns.get_loc("actual_worth")
+            ] += 1.0
+            chunk.iloc[:n_delta, chunk.columns.get_loc("transaction_id")] = [
+                f"2-{start + j}-2024" for j in range(n_delta)
+            ]
+        yield chunk
+
+
+def _timed(chunks, elapsed):
+    """
+    Passes chunks through, adding the time spent producing them to elapsed[0]
+    """
+
+    chunks = iter(chunks)
+    while True:
+        start = time.perf_counter()
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return
+        elapsed[0] += time.perf_counter() - start
+        yield chunk
+
+
+def benchmark_snapshot_diff(
+    n_rows=10_000_000, change_frac=0.01, chunk_rows=500_000, seed=42
+):
+    """
+    Hashing and diffing throughput and peak memory on a synthetic snapshot
+    with the DLD Transactions schema, streamed in chunks. Time spent
+    generating the chunks is not counted. Peak RSS is the whole process,
+    so run this in a fresh one.
+    """
+
+    from src.quantized_pool import peak_rss_mb
+
+    generation = [0.0]
+    start = time.perf_counter()
+    previous_index = hash_rows(
+        _timed(synthetic_snapshot_chunks(n_rows, chunk_rows, seed=seed), generation)
+    )
+    hash_seconds = time.perf_counter() - start - generation[0]
+
+    generation = [0.0]
+    start = time.perf_counter()
+    delta = diff_snapshot(
+        _timed(
+            synthetic_snapshot_chunks(n_rows, chunk_rows, change_frac, seed),
+            generation,
+        ),
+        previous_index,
+    )
+    diff_seconds = time.perf_counter() - start - generation[0]
+    peak_mb = peak_rss_mb()
+
+    print(f"Rows: {n_rows:,} in chunks of {chunk_rows:,}")
+    print(f"Hashing: {hash_seconds:.2f}s ({n_rows / hash_seconds:,.0f} rows/s)")
+    print(f"Hash + diff: {diff_seconds:.2f}s ({n_rows / diff_seconds:,.0f} rows/s)")
+    print(
+        f"Inserted: {len(delta['inserted']):,}, changed: {len(delta['changed']):,}, "
+        f"deleted: {len(delta['deleted']):,}"
+    )
+    print(f"Peak RSS: {peak_mb:,.0f} MB")
+
+    return {
+        "hash_seconds": hash_seconds,
+        "diff_seconds": diff_seconds,
+        "peak_rss_mb": peak_mb,
+    }
@@ -4,6 +4,7 @@ import datetime
 import numpy as np
 import pandas as pd
 import streamlit as st
+import sys
 
 st.set_page_config(layout="wide")
 
@@ -13,6 +14,16 @@ MODEL_PATH = BASE_DIR / "models" / "dubai_model_v11.cbm"
 PROJECT_NAME_PATH = BASE_DIR / "data" / "project_name_en.txt"
 MASTER_PROJECT_PATH = BASE_DIR / "data" / "master_project_en.txt"
 
+sys.path.append(str(BASE_DIR))
+from src.explanations import PredictionExplainer  # noqa: E402
+from src.inference_worker import InferenceWorker  # noqa: E402
+from src.intervals import (  # noqa: E402
+    model_quantiles,
+    point_prediction,
+    to_price_quantiles,
+)
+from src.sweep import area_range, future_dates, predict_sweep  # noqa: E402
+
 
 TRANS_GROUP_EN_OPTIONS = sorted(["Sales", "Mortgages", "Gifts"])
 REG_TYPE_EN_OPTIONS = sorted(["Existing Properties", "Off-Plan Properties"])
@@ -90,6 +101,22 @@ def load_model_and_artifacts():
 
 
 model, KNOWN_PROJECT_NAMES, KNOWN_MASTER_PROJECT_NAMES = load_model_and_artifacts()
+MODEL_QUANTILES = model_quantiles(model) if model is not None else None
+
+
+@st.cache_resource
+def get_inference_worker(_model):
+    # One worker per process: every session's predictions go through its queue
+    return InferenceWorker(_model, thread_count=2)
+
+
+@st.cache_resource
+def get_explainer(_model, _worker):
+    return PredictionExplainer(_model, worker=_worker)
+
+
+predictor = get_inference_worker(model) if model is not None else None
+explainer = get_explainer(model, predictor) if model is not None else None
 
 
 def create_input_dataframe(
@@ -260,8 +287,10 @@ else:
         )
 
         try:
-            prediction = model.predict(input_df)
-            predicted_price_per_sqm = np.expm1(prediction[0])
+            prediction = predictor.predict(input_df, timeout=30)
+            predicted_price_per_sqm = np.expm1(
+                point_prediction(prediction, MODEL_QUANTILES)[0]
+            )
             total_price = predicted_price_per_sqm * procedure_area_input
             st.subheader("Prediction Results:")
             st.metric(
@@ -272,11 +301,115 @@ else:
                 label="Estimated Total Property Price (AED)",
                 value=f"{total_price:,.0f}",
             )
+            if MODEL_QUANTILES is not None:
+                interval = to_price_quantiles(prediction, MODEL_QUANTILES).iloc[0]
+                st.metric(
+                    label=f"Likely Price Range per sq.m. (AED, "
+                    f"{interval.index[0].upper()}–{interval.index[-1].upper()})",
+                    value=f"{interval.iloc[0]:,.0f} – {interval.iloc[-1]:,.0f}",
+                )
+                st.metric(
+                    label="Likely Total Property Price Range (AED)",
+                    value=f"{interval.iloc[0] * procedure_area_input:,.0f} – "
+                    f"{interval.iloc[-1] * procedure_area_input:,.0f}",
+                )
+
+            # The price above doesn't depend on the explanation, so a failed
+            # SHAP job only hides this section
+            try:
+                explanation = explainer.explain(input_df, top_n=5)
+                contributions = explanation["contributions"]
+                st.subheader("What Drives This Price")
+                st.caption(
+                    f"Average price per sq.m. the model starts from: "
+                    f"{explanation['base_price_per_sqm']:,.0f} AED. "
+                    "Top features moving it up or down (AED per sq.m.):"
+                )
+                st.bar_chart(
+                    contributions.set_index("feature")["aed_per_sqm"],
+                    horizontal=True,
+                )
+                st.dataframe(
+                    contributions[["feature", "value", "aed_per_sqm"]]
+                    .astype({"value": str})
+                    .rename(
+                        columns={
+                            "feature": "Feature",
+                            "value": "Value",
+                            "aed_per_sqm": "Effect (AED per sq.m.)",
+                        }
+                    ),
+                    hide_index=True,
+                    use_container_width=True,
+                )
+            except Exception as e:
+                st.warning(f"Could not explain this prediction: {e}")
 
         except Exception as e:
             st.error(f"Error during prediction: {e}")
             st.exception(e)
 
+    st.subheader("Price Curve")
+    sweep_axis = st.selectbox(
+        "Vary:",
+        options=["Property Area", "District", "Future Months"],
+    )
+    compare_reg_types = st.checkbox("Compare Off-Plan vs Existing Properties")
+
+    if sweep_axis == "Property Area":
+        area_min, area_max = st.slider(
+            "Area range (sq.m.):",
+            min_value=10.0,
+            max_value=10000.0,
+            value=(30.0, 500.0),
+            step=10.0,
+        )
+    elif sweep_axis == "Future Months":
+        n_months = st.slider("Months ahead:", min_value=1, max_value=60, value=24)
+
+    if st.button("Build Price Curve", use_container_width=True):
+        base_df = create_input_dataframe(
+            trans_group=trans_group_en_input,
+            date_val=current_date_val,
+            reg_type=reg_type_en_input,
+            project_name=project_name_input_str,
+            master_project=master_project_name_input_str,
+            area=procedure_area_input,
+            proc_name_grouped=procedure_name_en_grouped_input,
+            district_val=district_input,
+            known_projects_set=KNOWN_PROJECT_NAMES,
+            known_master_projects_set=KNOWN_MASTER_PROJECT_NAMES,
+            unknown_placeholder=UNKNOWN_VALUE_PLACEHOLDER,
+        )
+
+        if sweep_axis == "Property Area":
+            x_col, axes = "procedure_area", {
+                "procedure_area": area_range(area_min, area_max, 200)
+            }
+        elif sweep_axis == "District":
+            x_col, axes = "district", {"district": DISTRICT_OPTIONS}
+        else:
+            x_col, axes = "date", {"date": future_dates(current_date_val, n_months)}
+        if compare_reg_types:
+            axes["reg_type_en"] = REG_TYPE_EN_OPTIONS
+
+        try:
+            curve_df = predict_sweep(predictor, base_df, axes)
+            chart_kwargs = dict(
+                x=x_col,
+                y="predicted_price_per_sqm",
+                color="reg_type_en" if compare_reg_types else None,
+            )
+            if sweep_axis == "District":
+                st.bar_chart(curve_df, **chart_kwargs)
+            else:
+                st.line_chart(curve_df, **chart_kwargs)
+            st.dataframe(curve_df, use_container_width=True)
+
+        except Exception as e:
+            st.error(f"Error during price curve prediction: {e}")
+            st.exception(e)
+
     st.sidebar.markdown("---")
     st.sidebar.markdown("**About this App**")
     st.sidebar.markdown(f"Model: CatBoost (loaded from `{MODEL_PATH}`)")
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+from src.intervals import model_quantiles, point_prediction, to_price_quantiles
+
+
+def area_range(start, stop, num=50):
+    """
+    Evenly spaced property areas (sq.m.) for a sweep axis
+    """
+
+    return np.linspace(float(start), float(stop), int(num))
+
+
+def future_dates(start, months=12):
+    """
+    First day of each month starting from the month of `start`
+    """
+
+    first = pd.Timestamp(start).to_period("M").to_timestamp()
+    return pd.date_range(first, periods=int(months), freq="MS")
+
+
+def build_sweep_grid(base_df, axes):
+    """
+    Expands a one-row input into the full cartesian grid over one or two axes
+    """
+
+    if len(base_df) != 1:
+        raise ValueError(f"Expected a single base row, got {len(base_df)}.")
+    if not 1 <= len(axes) <= 2:
+        raise ValueError(f"Expected one or two sweep axes, got {len(axes)}.")
+
+    axis_values = {}
+    for col, values in axes.items():
+        if col not in base_df.columns:
+            raise ValueError(f"Sweep axis '{col}' is not an input column.")
+        values = pd.to_datetime(values) if col == "date" else values
+        values = np.asarray(values)
+        if values.size == 0:
+            raise ValueError(f"Sweep axis '{col}' has no values.")
+        axis_values[col] = values
+
+    sizes = [len(v) for v in axis_values.values()]
+    n_points = int(np.prod(sizes))
+    grid_idx = np.meshgrid(*[np.arange(s) for s in sizes], indexing="ij")
+
+    columns = {}
+    for col in base_df.columns:
+        if col in axis_values:
+            pos = list(axis_values).index(col)
+            columns[col] = axis_values[col][grid_idx[pos].ravel()]
+        else:
+            columns[col] = np.repeat(base_df[col].to_numpy(), n_points)
+
+    grid = pd.DataFrame(columns, columns=base_df.columns)
+    if "procedure_area" in grid.columns:
+        grid["procedure_area"] = grid["procedure_area"].astype(float)
+    return grid
+
+
+def predict_sweep(model, base_df, axes):
+    """
+    Scores the whole what-if grid in a single predict call and returns a tidy
+    table with one row per grid point. Quantile models add one
+    price_per_sqm_pXX column per quantile.
+    """
+
+    grid = build_sweep_grid(base_df, axes)
+    prediction = model.predict(grid)
+    quantiles = model_quantiles(model)
+
+    result = grid[list(axes)].copy()
+    result["predicted_price_per_sqm"] = np.expm1(
+        point_prediction(prediction, quantiles)
+    )
+    if quantiles is not None:
+        for col, values in to_price_quantiles(prediction, quantiles).items():
+            result[f"price_per_sqm_{col}"] = values.to_numpy()
+    result["estimated_total_price"] = (
+        result["predicted_price_per_sqm"] * grid["procedure_area"].to_numpy()
+    )
+    return result
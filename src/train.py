@@ -4,6 +4,11 @@ import mlflow
 import mlflow.catboost
 import optuna
 from optuna.samplers import TPESampler
+from optuna.distributions import (
+    CategoricalDistribution,
+    FloatDistribution,
+    IntDistribution,
+)
 from catboost import CatBoostRegressor
 from sklearn.model_selection import cross_validate, TimeSeriesSplit
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
@@ -13,32 +18,137 @@ from mlflow.tracking import MlflowClient
 from mlflow.entities import ViewType
 import os
 
+from src.evaluation import default_segments, evaluate_segments
+from src.intervals import (
+    interval_metrics,
+    median_index,
+    multi_quantile_loss,
+    point_prediction,
+    quantile_column,
+    to_price_quantiles,
+)
+from src.quantized_pool import load_quantized_pool, quantized_pool_border_count
+from src.registry import RunRegistry, resolve_tracking_uri
+
+SEARCH_SPACE = {
+    "iterations": CategoricalDistribution([500, 1000]),
+    "learning_rate": FloatDistribution(0.01, 0.06),
+    "depth": IntDistribution(5, 10),
+    "l2_leaf_reg": FloatDistribution(1e-2, 20.0, log=True),
+    "border_count": CategoricalDistribution([64, 128]),
+    "random_strength": FloatDistribution(1e-2, 5.0, log=True),
+}
+
+N_STARTUP_TRIALS = 10
+
 
 class ModelTrainer:
     def __init__(
         self,
         experiment_name="CatBoost_Dubai_Real_Estate",
         model_base_name="catboost_dubai_property_model",
+        tracking_uri=None,
+        registry_path=None,
+        quantiles=None,
     ):
         self.experiment_name = experiment_name
         self.model_base_name = model_base_name
-        mlflow.set_tracking_uri("file:///Users/vitalyboldyrev/real_estate_uae/mlruns")
+        self.quantiles = list(quantiles) if quantiles else None
+        self.loss_function = (
+            multi_quantile_loss(self.quantiles) if self.quantiles else "RMSE"
+        )
+        self.tracking_uri = resolve_tracking_uri(tracking_uri)
+        mlflow.set_tracking_uri(self.tracking_uri)
         mlflow.set_experiment(experiment_name)
         self.client = MlflowClient()
+        self.registry = RunRegistry(self.tracking_uri, registry_path)
         print(f"MLflow experiment set to: {self.experiment_name}")
 
+    @staticmethod
+    def _suggest_params(trial):
+        params = {}
+        for name, dist in SEARCH_SPACE.items():
+            if isinstance(dist, CategoricalDistribution):
+                params[name] = trial.suggest_categorical(name, dist.choices)
+            elif isinstance(dist, IntDistribution):
+                params[name] = trial.suggest_int(name, dist.low, dist.high)
+            else:
+                params[name] = trial.suggest_float(
+                    name, dist.low, dist.high, log=dist.log
+                )
+        return params
+
+    @staticmethod
+    def _cast_params(raw_params):
+        """
+        MLflow stores params as strings. Returns None if a run's params
+        don't fit the current search space.
+        """
+
+        params = {}
+        for name, dist in SEARCH_SPACE.items():
+            raw = raw_params.get(name)
+            if raw is None:
+                return None
+            if isinstance(dist, CategoricalDistribution):
+                matches = [c for c in dist.choices if str(c) == raw]
+                if not matches:
+                    return None
+                params[name] = matches[0]
+                continue
+            value = int(float(raw)) if isinstance(dist, IntDistribution) else float(raw)
+            if not dist.low <= value <= dist.high:
+                return None
+            params[name] = value
+        return params
+
+    def _previous_trials(self, n_runs):
+        """
+        Best params and CV RMSE of the last `n_runs` logged for this model
+        """
+
+        try:
+            exp = self.client.get_experiment_by_name(self.experiment_name)
+            if exp is None:
+                return []
+            runs = self.client.search_runs(
+                [exp.experiment_id],
+                filter_string=f"tags.model_base_name = '{self.model_base_name}'",
+                run_view_type=ViewType.ACTIVE_ONLY,
+                order_by=["attributes.start_time DESC"],
+                max_results=n_runs,
+            )
+        except Exception as e:
+            print("Loading previous runs failed:", e)
+            return []
+
+        trials = []
+        for run in runs:
+            params = self._cast_params(run.data.params)
+            value = run.data.metrics.get("optuna_best_cv_score_neg_rmse")
+            if params is not None and value is not None:
+                trials.append((run.info.run_id, params, value))
+        return trials
+
+    def _latest_cv_rmse(self):
+        """
+        Best CV RMSE of the latest run of this model, from the run registry
+        """
+
+        entry = self.registry.latest_run(self.experiment_name, self.model_base_name)
+        if entry is None:
+            return None
+        return entry["metrics"].get("optuna_best_cv_score_neg_rmse")
+
+    def _cv_score(self, estimator, X, y):
+        y_pred = point_prediction(estimator.predict(X), self.quantiles)
+        return -np.sqrt(mean_squared_error(y, y_pred))
+
     def _objective(self, trial, X_train, y_train, cat_features, n_splits):
         params = {
-            "iterations": trial.suggest_categorical("iterations", [500, 1000]),
-            "learning_rate": trial.suggest_float("learning_rate", 0.01, 0.06),
-            "depth": trial.suggest_int("depth", 5, 10),
-            "l2_leaf_reg": trial.suggest_float("l2_leaf_reg", 1e-2, 20.0, log=True),
-            "border_count": trial.suggest_categorical("border_count", [64, 128]),
-            "random_strength": trial.suggest_float(
-                "random_strength", 1e-2, 5.0, log=True
-            ),
-            "loss_function": "RMSE",
-            "eval_metric": "RMSE",
+            **self._suggest_params(trial),
+            "loss_function": self.loss_function,
+            "eval_metric": self.loss_function,
             "cat_features": cat_features,
             "verbose": 0,
             "early_stopping_rounds": 50,
@@ -53,7 +163,7 @@ class ModelTrainer:
             model,
             X_train,
             y_train,
-            scoring="neg_root_mean_squared_error",
+            scoring=self._cv_score,
             cv=splitter,
             n_jobs=1,
         )
@@ -61,6 +171,12 @@ class ModelTrainer:
         return rmse
 
     def _next_version(self):
+        latest = self.registry.latest_version(
+            self.experiment_name, self.model_base_name
+        )
+        if latest is not None:
+            return f"v{latest + 1}"
+
         try:
             exp = self.client.get_experiment_by_name(self.experiment_name)
             if exp is None:
@@ -74,12 +190,125 @@ class ModelTrainer:
             )
             if not runs:
                 return "v1"
-            latest = runs[0].data.tags["mlflow.runName"].split("_v")[-1]
-            return f"v{int(latest) + 1}"
+            run_name = runs[0].data.tags["mlflow.runName"]
+            latest = int(run_name.split("_v")[-1])
+            self.registry.record_run(
+                self.experiment_name,
+                run_name,
+                runs[0].info.run_id,
+                model_base_name=self.model_base_name,
+                version=latest,
+                artifact_path=self.model_base_name,
+                metrics=runs[0].data.metrics,
+            )
+            return f"v{latest + 1}"
         except Exception as e:
             print("Version resolution failed:", e)
             return "v1"
 
+    def _log_run(
+        self,
+        final_model,
+        params,
+        X_test,
+        y_test,
+        extra_params=None,
+        extra_metrics=None,
+        shap_X=None,
+    ):
+        model_version_tag = self._next_version()
+        run_name = f"{self.model_base_name}_{model_version_tag}"
+
+        with mlflow.start_run(run_name=run_name) as run:
+            run_id = run.info.run_id
+            print(f"MLflow Run ID: {run_id}")
+            mlflow.log_params(params)
+            mlflow.log_params(extra_params or {})
+            mlflow.log_param("loss_function", self.loss_function)
+
+            prediction = final_model.predict(X_test)
+            y_pred_test = point_prediction(prediction, self.quantiles)
+            y_pred_test_price = np.expm1(y_pred_test)
+
+            metrics = {
+                **(extra_metrics or {}),
+                "test_rmse": np.sqrt(mean_squared_error(y_test, y_pred_test_price)),
+                "test_mae": mean_absolute_error(y_test, y_pred_test_price),
+                "test_r2": r2_score(y_test, y_pred_test_price),
+            }
+            if self.quantiles is not None:
+                metrics.update(
+                    interval_metrics(
+                        y_test,
+                        to_price_quantiles(prediction, self.quantiles),
+                        lower=quantile_column(min(self.quantiles)),
+                        upper=quantile_column(max(self.quantiles)),
+                    )
+                )
+            mlflow.log_metrics(metrics)
+
+            segment_metrics = evaluate_segments(
+                y_test, y_pred_test_price, default_segments(X_test)
+            )
+            mlflow.log_table(
+                data=segment_metrics,
+                artifact_file="evaluation/segment_metrics.json",
+            )
+            print(f"Logged test metrics for {len(segment_metrics)} segments.")
+
+            mlflow.set_tag("model_base_name", self.model_base_name)
+            mlflow.set_tag("model_version_tag", model_version_tag)
+
+            mlflow.catboost.log_model(
+                cb_model=final_model,
+                artifact_path=self.model_base_name,
+                registered_model_name=self.model_base_name,
+            )
+            print(f"Model logged to MLflow with artifact path: {self.model_base_name}")
+
+            if shap_X is not None:
+                print("Calculating SHAP values for X_train...")
+                explainer = shap.TreeExplainer(final_model)
+                shap_values = explainer.shap_values(shap_X)
+                if self.quantiles is not None:
+                    shap_values = shap_values[..., median_index(self.quantiles)]
+
+                shap_output_dir = "shap_outputs"
+                if not os.path.exists(shap_output_dir):
+                    os.makedirs(shap_output_dir)
+
+                shap_summary_path = os.path.join(
+                    shap_output_dir, f"{run_name}_shap_summary_bar.png"
+                )
+
+                plt.figure()
+                shap.summary_plot(
+                    shap_values, shap_X, plot_type="bar", show=False, max_display=25
+                )  # Увеличил max_display
+                plt.tight_layout()
+                plt.savefig(shap_summary_path)
+                plt.close()
+                mlflow.log_artifact(shap_summary_path, artifact_path="shap_plots")
+                print(
+                    f"SHAP summary plot (bar) saved to {shap_summary_path} and logged."
+                )
+
+        self.registry.record_run(
+            self.experiment_name,
+            run_name,
+            run_id,
+            model_base_name=self.model_base_name,
+            version=int(model_version_tag[1:]),
+            artifact_path=self.model_base_name,
+            metrics=metrics,
+        )
+
+        print(f"\n--- Training Summary ({run_name}) ---")
+        for name, value in metrics.items():
+            print(f"{name}: {value:.4f}")
+
+        return y_pred_test
+
     def train_and_log_model(
         self,
         X_train,
@@ -89,16 +318,55 @@ class ModelTrainer:
         cat_features=None,
         n_trials=10,
         cv_splits_for_optuna=3,
+        warm_start_runs=0,
     ):
         if isinstance(X_train, pd.DataFrame):
             cat_features = [X_train.columns.get_loc(c) for c in cat_features]
 
+        # With warm_start_runs, previous runs seed the study: their trials go
+        # into the TPE history and their params are enqueued to be
+        # re-evaluated on the current data. Otherwise the latest run from
+        # the registry only sets the target RMSE.
+        if warm_start_runs:
+            previous_trials = self._previous_trials(warm_start_runs)
+            print(f"Warm-starting from {len(previous_trials)} previous runs …")
+            target_rmse = min((v for _, _, v in previous_trials), default=None)
+        else:
+            previous_trials = []
+            target_rmse = self._latest_cv_rmse()
+
+        enqueued = []
+        for _, params, _ in previous_trials:
+            if params not in enqueued:
+                enqueued.append(params)
+
+        # TPE counts the imported and the enqueued trials towards its random
+        # startup phase, so it takes over right after the enqueued ones
+        n_startup_trials = N_STARTUP_TRIALS
+        if previous_trials:
+            n_startup_trials = min(
+                N_STARTUP_TRIALS, len(previous_trials) + len(enqueued)
+            )
+
         print("Running Optuna search …")
         study = optuna.create_study(
             direction="minimize",
-            sampler=TPESampler(seed=42, multivariate=True, n_startup_trials=10),
+            sampler=TPESampler(
+                seed=42, multivariate=True, n_startup_trials=n_startup_trials
+            ),
             pruner=optuna.pruners.MedianPruner(),
         )
+        for run_id, params, value in previous_trials:
+            study.add_trial(
+                optuna.trial.create_trial(
+                    params=params,
+                    distributions=SEARCH_SPACE,
+                    value=value,
+                    user_attrs={"imported_from_run": run_id},
+                )
+            )
+        for params in enqueued:
+            study.enqueue_trial(params)
 
         study.optimize(
             lambda trial: self._objective(
@@ -109,12 +377,35 @@ class ModelTrainer:
             timeout=3 * 60 * 60,
         )
 
-        best_params = study.best_params
+        evaluated_trials = [
+            t
+            for t in study.trials
+            if t.state == optuna.trial.TrialState.COMPLETE
+            and "imported_from_run" not in t.user_attrs
+        ]
+        best_trial = min(evaluated_trials, key=lambda t: t.value)
+        best_params = best_trial.params
         print("Best parameters:", best_params)
 
+        trials_to_target = None
+        if target_rmse is not None:
+            trials_to_target = next(
+                (
+                    i + 1
+                    for i, t in enumerate(evaluated_trials)
+                    if t.value <= target_rmse
+                ),
+                None,
+            )
+            print(
+                f"Trials to reach previous best CV RMSE {target_rmse:.4f}: "
+                f"{trials_to_target or 'not reached'}"
+            )
+
         final_model = CatBoostRegressor(
             **best_params,
             cat_features=cat_features,
+            loss_function=self.loss_function,
             random_state=42,
             verbose=100,
             task_type="CPU",
@@ -124,77 +415,73 @@ class ModelTrainer:
         print("Fitting final model on full training set …")
         final_model.fit(X_train, y_train, plot=False)
 
-        model_version_tag = self._next_version()
-        run_name = f"{self.model_base_name}_{model_version_tag}"
-
-        with mlflow.start_run(run_name=run_name) as run:
-            run_id = run.info.run_id
-            print(f"MLflow Run ID: {run_id}")
-            mlflow.log_params(best_params)
-            mlflow.log_param("optuna_n_trials_completed", len(study.trials))
-            mlflow.log_param("optuna_cv_splits", cv_splits_for_optuna)
-
-            y_pred_train = final_model.predict(X_train)
-            y_pred_test = final_model.predict(X_test)
-
-            train_rmse = np.sqrt(
-                mean_squared_error(np.expm1(y_train), np.expm1(y_pred_train))
-            )
-            test_rmse = np.sqrt(mean_squared_error(y_test, np.expm1(y_pred_test)))
-            test_mae = mean_absolute_error(y_test, np.expm1(y_pred_test))
-            test_r2 = r2_score(y_test, np.expm1(y_pred_test))
-            # train_rmse = np.sqrt(mean_squared_error(y_train, y_pred_train))
-            # test_rmse = np.sqrt(mean_squared_error(y_test, y_pred_test))
-            # test_mae = mean_absolute_error(y_test, y_pred_test)
-            # test_r2 = r2_score(y_test, y_pred_test)
-
-            mlflow.log_metrics(
-                {
-                    "optuna_best_cv_score_neg_rmse": study.best_value,
-                    "train_rmse": train_rmse,
-                    "test_rmse": test_rmse,
-                    "test_mae": test_mae,
-                    "test_r2": test_r2,
-                }
-            )
-
-            mlflow.set_tag("model_base_name", self.model_base_name)
-            mlflow.set_tag("model_version_tag", model_version_tag)
-
-            mlflow.catboost.log_model(
-                cb_model=final_model,
-                artifact_path=self.model_base_name,
-                registered_model_name=self.model_base_name,
-            )
-            print(f"Model logged to MLflow with artifact path: {self.model_base_name}")
+        extra_metrics = {
+            "optuna_best_cv_score_neg_rmse": best_trial.value,
+            "train_rmse": np.sqrt(
+                mean_squared_error(
+                    np.expm1(y_train),
+                    np.expm1(
+                        point_prediction(final_model.predict(X_train), self.quantiles)
+                    ),
+                )
+            ),
+        }
+        if trials_to_target is not None:
+            extra_metrics["optuna_trials_to_previous_best"] = trials_to_target
 
-            print("Calculating SHAP values for X_train...")
-            explainer = shap.TreeExplainer(final_model)
-            shap_values = explainer.shap_values(X_train)
+        y_pred_test = self._log_run(
+            final_model,
+            best_params,
+            X_test,
+            y_test,
+            extra_params={
+                "optuna_n_trials_completed": len(evaluated_trials),
+                "optuna_cv_splits": cv_splits_for_optuna,
+                "optuna_warm_start_runs": warm_start_runs,
+            },
+            extra_metrics=extra_metrics,
+            shap_X=X_train,
+        )
 
-            shap_output_dir = "shap_outputs"
-            if not os.path.exists(shap_output_dir):
-                os.makedirs(shap_output_dir)
+        return final_model, y_pred_test
 
-            shap_summary_path = os.path.join(
-                shap_output_dir, f"{run_name}_shap_summary_bar.png"
-            )
+    def train_and_log_quantized(self, train_pool_path, X_test, y_test, params=None):
+        """
+        Trains on a quantized pool built with
+        quantized_pool.build_quantized_pool. This does not bound memory:
+        building the pool loads the raw rows into CatBoost and training
+        holds the quantized pool, both growing with the number of rows, so
+        the chosen history must fit in RAM. Without `params` the best params
+        of the latest run are reused. The pool's own border count is logged,
+        since borders were fixed when it was quantized.
+        """
 
-            plt.figure()
-            shap.summary_plot(
-                shap_values, X_train, plot_type="bar", show=False, max_display=25
-            )  # Увеличил max_display
-            plt.tight_layout()
-            plt.savefig(shap_summary_path)
-            plt.close()
-            mlflow.log_artifact(shap_summary_path, artifact_path="shap_plots")
-            print(f"SHAP summary plot (bar) saved to {shap_summary_path} and logged.")
+        if params is None:
+            previous_trials = self._previous_trials(1)
+            if not previous_trials:
+                raise ValueError("No previous run found, pass params explicitly.")
+            params = previous_trials[0][1]
+        params = {k: v for k, v in params.items() if k != "border_count"}
 
-        print(f"\n--- Training Summary ({run_name}) ---")
-        print(f"Best Optuna CV (-RMSE): {study.best_value:.4f}")
-        print(f"Train RMSE: {train_rmse:.4f}")
-        print(f"Test RMSE: {test_rmse:.4f}")
-        print(f"Test MAE: {test_mae:.4f}")
-        print(f"Test R²: {test_r2:.4f}")
+        pool = load_quantized_pool(train_pool_path)
+        print(f"Fitting on quantized pool with {pool.num_row()} rows …")
+        final_model = CatBoostRegressor(
+            **params,
+            loss_function=self.loss_function,
+            random_state=42,
+            verbose=100,
+            task_type="CPU",
+        )
+        final_model.fit(pool, plot=False)
 
+        y_pred_test = self._log_run(
+            final_model,
+            {**params, "border_count": quantized_pool_border_count(train_pool_path)},
+            X_test,
+            y_test,
+            extra_params={
+                "train_pool": str(train_pool_path),
+                "train_rows": pool.num_row(),
+            },
+        )
         return final_model, y_pred_test